@@ -0,0 +1,187 @@
+import atexit
+import logging
+import queue
+import subprocess
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from config import DEBUG
+from log_pump import log_pump
+from logger import logger
+
+_CB_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix='core-cb')
+
+# lines a get_logs() subscriber may fall behind before its oldest ones are dropped
+SUBSCRIBER_BUFFER_SIZE = 1000
+
+
+def _run_callback(func: callable):
+    try:
+        func()
+    except Exception as exc:
+        logger.error(f'{func.__name__} callback raised: {exc}')
+
+
+def submit_callbacks(funcs: list):
+    for func in funcs:
+        try:
+            _CB_POOL.submit(_run_callback, func)
+        except RuntimeError:
+            # the pool refuses new work once the interpreter is shutting
+            # down, e.g. when stop() is called from the atexit hook
+            break
+
+
+def _put_dropping_oldest(buf: queue.Queue, line: bytes):
+    try:
+        buf.put_nowait(line)
+    except queue.Full:
+        # the subscriber is falling behind, make room like a bounded deque would
+        try:
+            buf.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            buf.put_nowait(line)
+        except queue.Full:
+            pass
+
+
+class BaseCore:
+    """
+    Log capturing, restart guarding and on_start/on_stop callbacks shared by the cores.
+    Subclasses implement get_version, start and stop.
+    """
+
+    name = "Core"
+
+    def __init__(self):
+        self.process = None
+        self._alive = False
+        self._restart_lock = threading.Lock()
+
+        self._logs_buffer = deque(maxlen=128)
+        # replaced (never mutated) on subscribe/unsubscribe so the capture
+        # thread can iterate it without taking a copy
+        self._temp_log_buffers = ()
+        self._temp_log_buffers_lock = threading.Lock()
+        self._on_start_funcs = []
+        self._on_stop_funcs = []
+
+        atexit.register(lambda: self.stop() if self.started else None)
+
+    def _capture_process_logs(self):
+        process = self.process
+        debug = DEBUG and logger.isEnabledFor(logging.DEBUG)
+        logs_buffer = self._logs_buffer
+        residual = b''
+
+        def on_data(data: bytes):
+            nonlocal residual
+            if data:
+                lines = (residual + data).split(b'\n')
+                residual = lines.pop()
+            else:
+                lines = [residual] if residual else []
+                residual = b''
+
+            temp_log_buffers = self._temp_log_buffers
+            for line in lines:
+                # kept as raw bytes, consumers decode when they need text
+                output = line.strip()
+                logs_buffer.append(output)
+                for buf in temp_log_buffers:
+                    _put_dropping_oldest(buf, output)
+                if debug:
+                    logger.debug(output.decode('utf-8', 'replace'))
+
+            # stdout hit EOF, the process is exiting
+            if not data:
+                # its pipe closes just before it turns into a zombie, give it
+                # a moment to finish so it gets reaped here; stop() drops it
+                # otherwise
+                try:
+                    process.wait(timeout=1)
+                except subprocess.TimeoutExpired:
+                    pass
+                if self.process is process:
+                    self._alive = False
+
+        log_pump.register(process.stdout, on_data)
+
+    @contextmanager
+    def get_logs(self, include_history: bool = False):
+        buf = queue.Queue(maxsize=SUBSCRIBER_BUFFER_SIZE)
+        if include_history:
+            for log in list(self._logs_buffer):
+                _put_dropping_oldest(buf, log)
+        try:
+            with self._temp_log_buffers_lock:
+                self._temp_log_buffers = self._temp_log_buffers + (buf,)
+            yield buf
+        except (EOFError, TimeoutError):
+            pass
+        finally:
+            with self._temp_log_buffers_lock:
+                self._temp_log_buffers = tuple(
+                    b for b in self._temp_log_buffers if b is not buf)
+
+    def _discard_process(self):
+        """Forgets a process that failed to start, killing it if it's still there."""
+        process, self.process = self.process, None
+        self._alive = False
+
+        try:
+            process.stdin.close()
+        except OSError:
+            pass
+        process.kill()
+        process.wait()
+
+    @property
+    def restarting(self):
+        return self._restart_lock.locked()
+
+    @property
+    def started(self):
+        return self._alive
+
+    def _probe_alive(self):
+        """Asks the OS whether the process is still running, unlike `started`."""
+        if not self.process:
+            return False
+
+        if self.process.poll() is None:
+            return True
+
+        return False
+
+    def _forget_exited_process(self):
+        """Reaps and drops a process that exited on its own, True if nothing is left running."""
+        if self._probe_alive():
+            return False
+
+        self._alive = False
+        self.process = None
+        return True
+
+    def restart(self, config: dict):
+        if not self._restart_lock.acquire(blocking=False):
+            return
+
+        try:
+            logger.warning(f"Restarting {self.name} core...")
+            self.stop()
+            self.start(config)
+        finally:
+            self._restart_lock.release()
+
+    def on_start(self, func: callable):
+        self._on_start_funcs.append(func)
+        return func
+
+    def on_stop(self, func: callable):
+        self._on_stop_funcs.append(func)
+        return func
@@ -0,0 +1,94 @@
+import os
+import selectors
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from logger import logger
+
+# Linux only, missing from the fcntl module before python 3.10
+F_SETPIPE_SZ = getattr(fcntl, 'F_SETPIPE_SZ', 1031)
+
+
+class LogPump:
+    """
+    Reads the output pipes of all running cores from a single thread.
+    Registered callbacks get every block read from their pipe, and b'' once on EOF.
+    """
+
+    def __init__(self, chunk_size: int = 65536, pipe_size: int = 1 << 20):
+        self.chunk_size = chunk_size
+        self.pipe_size = pipe_size
+
+        self._selector = selectors.DefaultSelector()
+        self._lock = threading.Lock()
+        self._thread = None
+
+        # written to by register() to wake up a select() that is already blocking
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        os.set_blocking(self._wakeup_r, False)
+        os.set_blocking(self._wakeup_w, False)
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ)
+
+    def _enlarge_pipe(self, fd: int):
+        """Gives a noisy core room to write bursts without blocking on us."""
+        if fcntl is None:
+            return
+
+        try:
+            fcntl.fcntl(fd, F_SETPIPE_SZ, self.pipe_size)
+        except OSError as exc:
+            # not a pipe, not Linux, or above /proc/sys/fs/pipe-max-size
+            logger.debug(f'Could not resize pipe: {exc}')
+
+    def register(self, fileobj, callback: callable):
+        self._enlarge_pipe(fileobj.fileno())
+        os.set_blocking(fileobj.fileno(), False)
+
+        with self._lock:
+            self._selector.register(fileobj, selectors.EVENT_READ, callback)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='log-pump', daemon=True)
+                self._thread.start()
+
+        try:
+            os.write(self._wakeup_w, b'\0')
+        except BlockingIOError:
+            # a wakeup is already pending
+            pass
+
+    def _run(self):
+        while True:
+            for key, _ in self._selector.select():
+                if key.data is None:
+                    try:
+                        os.read(self._wakeup_r, 4096)
+                    except BlockingIOError:
+                        pass
+                    continue
+
+                try:
+                    data = os.read(key.fd, self.chunk_size)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    data = b''
+
+                if not data:
+                    with self._lock:
+                        self._selector.unregister(key.fileobj)
+
+                try:
+                    key.data(data)
+                except Exception as exc:
+                    logger.error(f'Log pump callback raised: {exc}')
+
+
+log_pump = LogPump()
+
+__all__ = [
+    "log_pump"
+]
@@ -168,8 +168,8 @@ class Service(object):
                 end_time = start_time + 3
                 last_log = ''
                 while time.time() < end_time:
-                    while logs:
-                        log = logs.popleft()
+                    while not logs.empty():
+                        log = logs.get().decode('utf-8', 'replace')
                         if log:
                             last_log = log
                         if f'Xray {self.core_version} started' in log:
@@ -223,8 +223,8 @@ class Service(object):
                 end_time = start_time + 3
                 last_log = ''
                 while time.time() < end_time:
-                    while logs:
-                        log = logs.popleft()
+                    while not logs.empty():
+                        log = logs.get().decode('utf-8', 'replace')
                         if log:
                             last_log = log
                         if f'Xray {self.core_version} started' in log:
@@ -272,7 +272,7 @@ class Service(object):
 
         cache = ''
         last_sent_ts = 0
-        with self.core.get_logs() as logs:
+        with self.core.get_logs(include_history=True) as logs:
             while session_id == self.session_id:
                 if interval and time.time() - last_sent_ts >= interval and cache:
                     try:
@@ -282,7 +282,7 @@ class Service(object):
                     cache = ''
                     last_sent_ts = time.time()
 
-                if not logs:
+                if logs.empty():
                     try:
                         await asyncio.wait_for(websocket.receive(), timeout=0.2)
                         continue
@@ -291,7 +291,7 @@ class Service(object):
                     except (WebSocketDisconnect, RuntimeError):
                         break
 
-                log = logs.popleft()
+                log = logs.get().decode('utf-8', 'replace')
 
                 if interval:
                     cache += f'{log}\n'
@@ -332,8 +332,8 @@ class Service(object):
                 end_time = start_time + 3
                 last_log = ''
                 while time.time() < end_time:
-                    while logs:
-                        log = logs.popleft()
+                    while not logs.empty():
+                        log = logs.get().decode('utf-8', 'replace')
                         if log:
                             last_log = log
                         if 'started' in log.lower():
@@ -399,8 +399,8 @@ class Service(object):
                 end_time = start_time + 3
                 last_log = ''
                 while time.time() < end_time:
-                    while logs:
-                        log = logs.popleft()
+                    while not logs.empty():
+                        log = logs.get().decode('utf-8', 'replace')
                         if log:
                             last_log = log
                         if 'started' in log.lower():
@@ -451,7 +451,7 @@ class Service(object):
 
         cache = ''
         last_sent_ts = 0
-        with self.singbox_core.get_logs() as logs:
+        with self.singbox_core.get_logs(include_history=True) as logs:
             while session_id == self.session_id:
                 if interval and time.time() - last_sent_ts >= interval and cache:
                     try:
@@ -461,7 +461,7 @@ class Service(object):
                     cache = ''
                     last_sent_ts = time.time()
 
-                if not logs:
+                if logs.empty():
                     try:
                         await asyncio.wait_for(websocket.receive(), timeout=0.2)
                         continue
@@ -470,7 +470,7 @@ class Service(object):
                     except (WebSocketDisconnect, RuntimeError):
                         break
 
-                log = logs.popleft()
+                log = logs.get().decode('utf-8', 'replace')
 
                 if interval:
                     cache += f'{log}\n'
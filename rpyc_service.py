@@ -1,6 +1,8 @@
+import functools
+import queue
 import time
 from socket import socket
-from threading import Thread
+from threading import Event, Thread
 
 import rpyc
 
@@ -16,41 +18,76 @@ from xray import XRayConfig, XRayCore
 
 if SINGBOX_ENABLED:
     from singbox import SingBoxConfig, SingBoxCore
+else:
+    SingBoxConfig = SingBoxCore = None
+
+# callbacks the peer may expose on its service
+_PEER_CALLBACKS = ('on_start', 'on_stop', 'on_singbox_start', 'on_singbox_stop')
+
+
+def _require_singbox(func: callable):
+    """Makes a sing-box RPC raise when sing-box is disabled on this node."""
+    # decided once when the class is built, so enabled nodes pay nothing per call
+    if SINGBOX_ENABLED:
+        return func
+
+    @functools.wraps(func)
+    def disabled(*args, **kwargs):
+        raise RuntimeError("Sing-box is not enabled on this node")
+
+    return disabled
 
 
 class CoreLogsHandler(object):
     """Generic logs handler for both Xray and Sing-box cores."""
-    def __init__(self, core, callback: callable, interval: float = 0.6):
+    def __init__(self, core, callback: callable, interval: float = 0.6,
+                 include_history: bool = False):
         self.core = core
         self.callback = callback
         self.interval = interval
-        self.active = True
+        self.include_history = include_history
+        self._stop_event = Event()
         self.thread = Thread(target=self.cast, daemon=True)
         self.thread.start()
 
+    @property
+    def active(self):
+        return not self._stop_event.is_set()
+
     def stop(self):
-        self.active = False
+        self._stop_event.set()
         self.thread.join(timeout=2)
 
     def cast(self):
-        with self.core.get_logs() as logs:
-            cache = ''
+        stopped = self._stop_event.is_set
+        callback = self.callback
+        interval = self.interval
+        now = time.time
+        with self.core.get_logs(self.include_history) as logs:
+            get, get_nowait = logs.get, logs.get_nowait
+            cache = []
             last_sent_ts = 0
-            while self.active:
-                if time.time() - last_sent_ts >= self.interval and cache:
+            while not stopped():
+                # block until the capture thread hands us a line, or only
+                # until the next flush is due when lines are already cached,
+                # then take whatever else is already queued
+                timeout = max(0, last_sent_ts + interval - now()) if cache else interval
+                try:
+                    cache.append(get(timeout=timeout))
+                    while True:
+                        cache.append(get_nowait())
+                except queue.Empty:
+                    pass
+
+                ts = now()
+                if cache and ts - last_sent_ts >= interval:
+                    payload = (b'\n'.join(cache) + b'\n').decode('utf-8', 'replace')
+                    cache.clear()
                     try:
-                        self.callback(cache)
+                        callback(payload)
                     except Exception:
                         pass
-                    cache = ''
-                    last_sent_ts = time.time()
-
-                if not logs:
-                    time.sleep(0.2)
-                    continue
-
-                log = logs.popleft()
-                cache += f'{log}\n'
+                    last_sent_ts = ts
 
 
 # Alias for backward compatibility
@@ -63,6 +100,21 @@ class XrayService(rpyc.Service):
         self.core = None
         self.singbox_core = None
         self.connection = None
+        self._peer_caps = None
+
+    def _peer_has(self, name: str) -> bool:
+        """Checks the peer's service for a callback, probing it only once per connection."""
+        if not self.connection:
+            return False
+
+        if self._peer_caps is None:
+            try:
+                root = self.connection.root
+                self._peer_caps = {cap for cap in _PEER_CALLBACKS if hasattr(root, cap)}
+            except Exception:
+                return False
+
+        return name in self._peer_caps
 
     def on_connect(self, conn):
         if self.connection:
@@ -80,6 +132,7 @@ class XrayService(rpyc.Service):
         peer, _ = socket.getpeername(conn._channel.stream.sock)
         self.connection = conn
         self.connection.peer = peer
+        self._peer_caps = None
         logger.warning(f'Connected to {self.connection.peer}')
 
     def on_disconnect(self, conn):
@@ -95,6 +148,7 @@ class XrayService(rpyc.Service):
             self.core = None
             self.singbox_core = None
             self.connection = None
+            self._peer_caps = None
 
     @rpyc.exposed
     def start(self, config: str):
@@ -106,7 +160,7 @@ class XrayService(rpyc.Service):
             self.core = XRayCore(executable_path=XRAY_EXECUTABLE_PATH,
                                  assets_path=XRAY_ASSETS_PATH)
 
-            if self.connection and hasattr(self.connection.root, 'on_start'):
+            if self._peer_has('on_start'):
                 @self.core.on_start
                 def on_start():
                     try:
@@ -118,7 +172,7 @@ class XrayService(rpyc.Service):
                 logger.debug(
                     "Peer doesn't have on_start function on it's service, skipped")
 
-            if self.connection and hasattr(self.connection.root, 'on_stop'):
+            if self._peer_has('on_stop'):
                 @self.core.on_stop
                 def on_stop():
                     try:
@@ -146,6 +200,9 @@ class XrayService(rpyc.Service):
 
     @rpyc.exposed
     def restart(self, config: str):
+        if self.core is None:
+            return self.start(config)
+
         config = XRayConfig(config, self.connection.peer)
         self.core.restart(config)
 
@@ -157,19 +214,19 @@ class XrayService(rpyc.Service):
         return self.core.version
 
     @rpyc.exposed
-    def fetch_logs(self, callback: callable) -> XrayCoreLogsHandler:
+    def fetch_logs(self, callback: callable,
+                   include_history: bool = False) -> XrayCoreLogsHandler:
         if self.core:
-            logs = XrayCoreLogsHandler(self.core, callback)
+            logs = XrayCoreLogsHandler(self.core, callback,
+                                       include_history=include_history)
             logs.exposed_stop = logs.stop
             logs.exposed_cast = logs.cast
             return logs
 
     # Sing-box methods
     @rpyc.exposed
+    @_require_singbox
     def singbox_start(self, config: str):
-        if not SINGBOX_ENABLED:
-            raise RuntimeError("Sing-box is not enabled on this node")
-
         if self.singbox_core is not None:
             self.singbox_stop()
 
@@ -180,7 +237,7 @@ class XrayService(rpyc.Service):
                 working_dir=SINGBOX_WORKING_DIR
             )
 
-            if self.connection and hasattr(self.connection.root, 'on_singbox_start'):
+            if self._peer_has('on_singbox_start'):
                 @self.singbox_core.on_start
                 def on_start():
                     try:
@@ -189,7 +246,7 @@ class XrayService(rpyc.Service):
                     except Exception as exc:
                         logger.debug('Peer on_singbox_start exception:', exc)
 
-            if self.connection and hasattr(self.connection.root, 'on_singbox_stop'):
+            if self._peer_has('on_singbox_stop'):
                 @self.singbox_core.on_stop
                 def on_stop():
                     try:
@@ -213,15 +270,13 @@ class XrayService(rpyc.Service):
         self.singbox_core = None
 
     @rpyc.exposed
+    @_require_singbox
     def singbox_restart(self, config: str):
-        if not SINGBOX_ENABLED:
-            raise RuntimeError("Sing-box is not enabled on this node")
+        if self.singbox_core is None:
+            return self.singbox_start(config)
 
         config = SingBoxConfig(config, self.connection.peer)
-        if self.singbox_core:
-            self.singbox_core.restart(config)
-        else:
-            self.singbox_start(config)
+        self.singbox_core.restart(config)
 
     @rpyc.exposed
     def fetch_singbox_version(self):
@@ -230,11 +285,7 @@ class XrayService(rpyc.Service):
 
         if self.singbox_core is None:
             # Try to get version without starting
-            temp_core = SingBoxCore(
-                executable_path=SINGBOX_EXECUTABLE_PATH,
-                working_dir=SINGBOX_WORKING_DIR
-            )
-            return temp_core.version
+            return SingBoxCore.read_version(SINGBOX_EXECUTABLE_PATH)
 
         return self.singbox_core.version
 
@@ -243,9 +294,11 @@ class XrayService(rpyc.Service):
         return SINGBOX_ENABLED
 
     @rpyc.exposed
-    def fetch_singbox_logs(self, callback: callable) -> CoreLogsHandler:
+    def fetch_singbox_logs(self, callback: callable,
+                           include_history: bool = False) -> CoreLogsHandler:
         if self.singbox_core:
-            logs = CoreLogsHandler(self.singbox_core, callback)
+            logs = CoreLogsHandler(self.singbox_core, callback,
+                                   include_history=include_history)
             logs.exposed_stop = logs.stop
             logs.exposed_cast = logs.cast
             return logs
@@ -1,19 +1,45 @@
-import atexit
+import io
 import json
+import os
 import re
 import subprocess
-import threading
-from collections import deque
-from contextlib import contextmanager
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 from config import (
-    DEBUG,
     SSL_CERT_FILE,
     SSL_KEY_FILE,
     SINGBOX_INBOUNDS,
 )
+from core import BaseCore, submit_callbacks
 from logger import logger
 
+_VERSION_RE = re.compile(r'version\s+(\d+\.\d+\.\d+)')
+_SINGBOX_INBOUNDS_SET = frozenset(SINGBOX_INBOUNDS) if SINGBOX_INBOUNDS else None
+
+
+def _orjson_option(json_kwargs: dict):
+    """Maps json.dumps kwargs to an orjson option, None if orjson can't honour them."""
+    if orjson is None:
+        return None
+
+    option = 0
+    for key, value in json_kwargs.items():
+        if key == 'sort_keys':
+            if value:
+                option |= orjson.OPT_SORT_KEYS
+        elif key == 'indent':
+            if value == 2:
+                option |= orjson.OPT_INDENT_2
+            elif value is not None:
+                return None
+        else:
+            return None
+    return option
+
 
 class SingBoxConfig(dict):
     """
@@ -24,7 +50,7 @@ class SingBoxConfig(dict):
     SUPPORTED_PROTOCOLS = {"hysteria2", "tuic", "wireguard"}
 
     def __init__(self, config: str, peer_ip: str):
-        config = json.loads(config)
+        config = orjson.loads(config) if orjson else json.loads(config)
 
         self.ssl_cert = SSL_CERT_FILE
         self.ssl_key = SSL_KEY_FILE
@@ -34,104 +60,76 @@ class SingBoxConfig(dict):
         self._apply_filters()
 
     def to_json(self, **json_kwargs):
+        option = _orjson_option(json_kwargs)
+        if option is not None:
+            return orjson.dumps(self, option=option).decode('utf-8')
         return json.dumps(self, **json_kwargs)
 
+    def dump(self, fp, **json_kwargs):
+        """Streams the config as UTF-8 json into a binary file object."""
+        option = _orjson_option(json_kwargs)
+        if option is not None:
+            fp.write(orjson.dumps(self, option=option))
+            fp.flush()
+            return
+
+        writer = io.TextIOWrapper(fp, encoding='utf-8')
+        json.dump(self, writer, **json_kwargs)
+        writer.flush()
+        writer.detach()
+
     def _apply_filters(self):
         """Filter inbounds based on SINGBOX_INBOUNDS configuration."""
-        if not SINGBOX_INBOUNDS:
+        if _SINGBOX_INBOUNDS_SET is None:
             return
 
-        filtered_inbounds = []
-        for inbound in self.get('inbounds', []):
-            tag = inbound.get('tag')
-            if tag in SINGBOX_INBOUNDS:
-                filtered_inbounds.append(inbound)
+        self['inbounds'] = [inbound for inbound in self.get('inbounds', ())
+                            if inbound.get('tag') in _SINGBOX_INBOUNDS_SET]
+
 
-        self['inbounds'] = filtered_inbounds
+class SingBoxCore(BaseCore):
+    name = "Sing-box"
 
+    # (executable_path, mtime, version) of the last `sing-box version` call
+    _cached_version = None
 
-class SingBoxCore:
     def __init__(self,
                  executable_path: str = "/usr/local/bin/sing-box",
                  working_dir: str = "/var/lib/marzban-node"):
         self.executable_path = executable_path
         self.working_dir = working_dir
 
+        super().__init__()
         self.version = self.get_version()
-        self.process = None
-        self.restarting = False
 
-        self._logs_buffer = deque(maxlen=100)
-        self._temp_log_buffers = {}
-        self._on_start_funcs = []
-        self._on_stop_funcs = []
+    @classmethod
+    def read_version(cls, executable_path: str):
+        """Returns the executable's version, only running it again once it has changed on disk."""
+        try:
+            mtime = os.stat(executable_path).st_mtime
+        except OSError:
+            # not a plain path (e.g. resolved through PATH), don't cache
+            mtime = None
 
-        atexit.register(lambda: self.stop() if self.started else None)
+        cached = cls._cached_version
+        if mtime is not None and cached and cached[:2] == (executable_path, mtime):
+            return cached[2]
 
-    def get_version(self):
         try:
-            cmd = [self.executable_path, "version"]
+            cmd = [executable_path, "version"]
             output = subprocess.check_output(
                 cmd, stderr=subprocess.STDOUT).decode('utf-8')
-            m = re.search(r'version\s+(\d+\.\d+\.\d+)', output)
-            if m:
-                return m.group(1)
         except (subprocess.CalledProcessError, FileNotFoundError):
             return None
 
-    def __capture_process_logs(self):
-        def capture_and_debug_log():
-            while self.process:
-                output = self.process.stdout.readline()
-                if output:
-                    output = output.strip()
-                    self._logs_buffer.append(output)
-                    for buf in list(self._temp_log_buffers.values()):
-                        buf.append(output)
-                    logger.debug(output)
-
-                elif not self.process or self.process.poll() is not None:
-                    break
-
-        def capture_only():
-            while self.process:
-                output = self.process.stdout.readline()
-                if output:
-                    output = output.strip()
-                    self._logs_buffer.append(output)
-                    for buf in list(self._temp_log_buffers.values()):
-                        buf.append(output)
-
-                elif not self.process or self.process.poll() is not None:
-                    break
-
-        if DEBUG:
-            threading.Thread(target=capture_and_debug_log, daemon=True).start()
-        else:
-            threading.Thread(target=capture_only, daemon=True).start()
+        m = _VERSION_RE.search(output)
+        version = m.group(1) if m else None
+        if mtime is not None:
+            cls._cached_version = (executable_path, mtime, version)
+        return version
 
-    @contextmanager
-    def get_logs(self):
-        buf = deque(self._logs_buffer, maxlen=100)
-        buf_id = id(buf)
-        try:
-            self._temp_log_buffers[buf_id] = buf
-            yield buf
-        except (EOFError, TimeoutError):
-            pass
-        finally:
-            if buf_id in self._temp_log_buffers:
-                del self._temp_log_buffers[buf_id]
-
-    @property
-    def started(self):
-        if not self.process:
-            return False
-
-        if self.process.poll() is None:
-            return True
-
-        return False
+    def get_version(self):
+        return self.read_version(self.executable_path)
 
     def start(self, config: SingBoxConfig):
         if self.started is True:
@@ -152,25 +150,29 @@ class SingBoxCore:
             cwd=self.working_dir,
             stdin=subprocess.PIPE,
             stderr=subprocess.STDOUT,
-            stdout=subprocess.PIPE,
-            universal_newlines=True
+            stdout=subprocess.PIPE
         )
-        self.process.stdin.write(config.to_json())
-        self.process.stdin.flush()
-        self.process.stdin.close()
-
-        self.__capture_process_logs()
+        # read output before feeding the config, so a core that exits
+        # early still reaches EOF and clears the started flag
+        self._alive = True
+        self._capture_process_logs()
+        try:
+            config.dump(self.process.stdin)
+            self.process.stdin.close()
+        except OSError:
+            self._discard_process()
+            raise
 
         # Execute on start functions
-        for func in self._on_start_funcs:
-            threading.Thread(target=func, daemon=True).start()
+        submit_callbacks(self._on_start_funcs)
 
         logger.warning(f"Sing-box core {self.version} started")
 
     def stop(self):
-        if not self.started:
+        if self._forget_exited_process():
             return
 
+        self._alive = False
         self.process.terminate()
         try:
             self.process.wait(timeout=5)
@@ -180,25 +182,4 @@ class SingBoxCore:
         logger.warning("Sing-box core stopped")
 
         # Execute on stop functions
-        for func in self._on_stop_funcs:
-            threading.Thread(target=func, daemon=True).start()
-
-    def restart(self, config: SingBoxConfig):
-        if self.restarting is True:
-            return
-
-        self.restarting = True
-        try:
-            logger.warning("Restarting Sing-box core...")
-            self.stop()
-            self.start(config)
-        finally:
-            self.restarting = False
-
-    def on_start(self, func: callable):
-        self._on_start_funcs.append(func)
-        return func
-
-    def on_stop(self, func: callable):
-        self._on_stop_funcs.append(func)
-        return func
+        submit_callbacks(self._on_stop_funcs)
@@ -1,12 +1,9 @@
-import atexit
 import json
 import re
 import subprocess
-import threading
-from collections import deque
-from contextlib import contextmanager
 
-from config import DEBUG, SSL_CERT_FILE, SSL_KEY_FILE, XRAY_API_HOST, XRAY_API_PORT, INBOUNDS
+from config import SSL_CERT_FILE, SSL_KEY_FILE, XRAY_API_HOST, XRAY_API_PORT, INBOUNDS
+from core import BaseCore, submit_callbacks
 from logger import logger
 
 
@@ -97,27 +94,21 @@ class XRayConfig(dict):
             self["routing"]["rules"].insert(0, rule)
 
 
-class XRayCore:
+class XRayCore(BaseCore):
+    name = "Xray"
+
     def __init__(self,
                  executable_path: str = "/usr/bin/xray",
                  assets_path: str = "/usr/share/xray"):
         self.executable_path = executable_path
         self.assets_path = assets_path
 
+        super().__init__()
         self.version = self.get_version()
-        self.process = None
-        self.restarting = False
-
-        self._logs_buffer = deque(maxlen=100)
-        self._temp_log_buffers = {}
-        self._on_start_funcs = []
-        self._on_stop_funcs = []
         self._env = {
             "XRAY_LOCATION_ASSET": assets_path
         }
 
-        atexit.register(lambda: self.stop() if self.started else None)
-
     def get_version(self):
         cmd = [self.executable_path, "version"]
         output = subprocess.check_output(
@@ -126,60 +117,6 @@ class XRayCore:
         if m:
             return m.groups()[0]
 
-    def __capture_process_logs(self):
-        def capture_and_debug_log():
-            while self.process:
-                output = self.process.stdout.readline()
-                if output:
-                    output = output.strip()
-                    self._logs_buffer.append(output)
-                    for buf in list(self._temp_log_buffers.values()):
-                        buf.append(output)
-                    logger.debug(output)
-
-                elif not self.process or self.process.poll() is not None:
-                    break
-
-        def capture_only():
-            while self.process:
-                output = self.process.stdout.readline()
-                if output:
-                    output = output.strip()
-                    self._logs_buffer.append(output)
-                    for buf in list(self._temp_log_buffers.values()):
-                        buf.append(output)
-
-                elif not self.process or self.process.poll() is not None:
-                    break
-
-        if DEBUG:
-            threading.Thread(target=capture_and_debug_log).start()
-        else:
-            threading.Thread(target=capture_only).start()
-
-    @contextmanager
-    def get_logs(self):
-        buf = deque(self._logs_buffer, maxlen=100)
-        buf_id = id(buf)
-        try:
-            self._temp_log_buffers[buf_id] = buf
-            yield buf
-        except (EOFError, TimeoutError):
-            pass
-        finally:
-            del self._temp_log_buffers[buf_id]
-            del buf
-
-    @property
-    def started(self):
-        if not self.process:
-            return False
-
-        if self.process.poll() is None:
-            return True
-
-        return False
-
     def start(self, config: XRayConfig):
         if self.started is True:
             raise RuntimeError("Xray is started already")
@@ -198,47 +135,31 @@ class XRayCore:
             env=self._env,
             stdin=subprocess.PIPE,
             stderr=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            universal_newlines=True
+            stdout=subprocess.PIPE
         )
-        self.process.stdin.write(config.to_json())
-        self.process.stdin.flush()
-        self.process.stdin.close()
-
-        self.__capture_process_logs()
+        # read output before feeding the config, so a core that exits
+        # early still reaches EOF and clears the started flag
+        self._alive = True
+        self._capture_process_logs()
+        try:
+            self.process.stdin.write(config.to_json().encode('utf-8'))
+            self.process.stdin.flush()
+            self.process.stdin.close()
+        except OSError:
+            self._discard_process()
+            raise
 
         # execute on start functions
-        for func in self._on_start_funcs:
-            threading.Thread(target=func).start()
+        submit_callbacks(self._on_start_funcs)
 
     def stop(self):
-        if not self.started:
+        if self._forget_exited_process():
             return
 
+        self._alive = False
         self.process.terminate()
         self.process = None
         logger.warning("Xray core stopped")
 
         # execute on stop functions
-        for func in self._on_stop_funcs:
-            threading.Thread(target=func).start()
-
-    def restart(self, config: XRayConfig):
-        if self.restarting is True:
-            return
-
-        self.restarting = True
-        try:
-            logger.warning("Restarting Xray core...")
-            self.stop()
-            self.start(config)
-        finally:
-            self.restarting = False
-
-    def on_start(self, func: callable):
-        self._on_start_funcs.append(func)
-        return func
-
-    def on_stop(self, func: callable):
-        self._on_stop_funcs.append(func)
-        return func
+        submit_callbacks(self._on_stop_funcs)